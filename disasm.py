@@ -5,9 +5,12 @@ from collections import OrderedDict
 from sys import stdout, stderr, exit
 from io import StringIO, BytesIO
 from os import urandom
+import mmap
 import os.path
 from base64 import b32encode
+from bisect import bisect_right
 from argparse import ArgumentParser
+from concurrent.futures import ProcessPoolExecutor
 from typing import Any
 
 mmio = {
@@ -96,6 +99,13 @@ mappers = {
     232: ('Camerica/Codemasters Quattro (Multicarts)', 16, 0),
 }
 
+# Dense MMIO name table: mmio's keys all fall in [0x2000, 0x4020), so one
+# range check plus a list index replaces two dict lookups per absolute
+# operand.
+_MMIO_TAB = [None] * 0x2020
+for _addr, _name in mmio.items():
+    _MMIO_TAB[_addr - 0x2000] = _name
+
 def parse_args():
     parser = ArgumentParser()
     parser.add_argument('filename', nargs='?', help='The rom file to disassemble')
@@ -146,19 +156,58 @@ def parse_args():
         pass
     return parser.parse_args()
 
+# Hex strings for every byte value, precomputed so the hot output paths can
+# index a tuple instead of running the format machinery for each byte.
+HEX256 = tuple(f'{i:02x}' for i in range(256))
+
 class OpType(Enum):
     IMPLIED, IMMMEDIATE, ACCUMULATOR, BRANCH, ZEROPAGE, ABSOLUTE, INDIRECT = range(7)
 
-class Indexing(Enum):
-    NONE, X, Y = ('', 'x', 'y')
+# Mnemonic groups shared by the opcode classifiers, hoisted to module scope
+# so they are built once.
+_MNEMONIC_ALU = ('ora', 'and', 'eor', 'adc', 'sta', 'lda', 'cmp', 'sbc')
+_MNEMONIC_ALU_IMM = ('ora', 'and', 'eor', 'adc', '', 'lda', 'cmp', 'sbc')
+_MNEMONIC_RMW = ('asl', 'rol', 'lsr', 'ror', 'stx', 'ldx', 'dec', 'inc')
+_MNEMONIC_INDEX = ('sty', 'ldy', 'cpy', 'cpx')
+_MNEMONIC_INDEX_IMM = ('', 'ldy', 'cpy', 'cpx')
+_MNEMONIC_FLAG = ('php', 'clc', 'plp', 'sec', 'pha', 'cli', 'pla', 'sei',
+                  'dey', 'tya', 'tay', 'clv', 'iny', 'cld', 'inx', 'sed')
+_MNEMONIC_TRANSFER = ('txa', 'txs', 'tax', 'tsx', 'dex', '', 'nop', '')
+_MNEMONIC_BRANCH = ('bpl', 'bmi', 'bvc', 'bvs', 'bcc', 'bcs', 'bne', 'beq')
+
+# Small integer tags identifying the component classes, compared in the
+# decode loop instead of type() identity checks.
+_KIND_SUB, _KIND_TAB, _KIND_WORD = range(3)
+
+# Frozensets for the hot mnemonic membership tests.
+_SUB_END_OPS = frozenset(('rts', 'rti', 'jmp'))
+_STORE_OPS = frozenset(('sta', 'stx', 'sty', 'dec', 'inc'))
+_JUMP_OPS = frozenset(('jmp', 'jsr'))
+
+_ADDR_CACHE = {}
+
+def addr_str(addr:int) -> str:
+    """
+    Formats a 16 bit address as '$xxxx', caching each result lazily since
+    jump targets and data addresses repeat heavily within a bank.
+    """
+    try:
+        return _ADDR_CACHE[addr]
+    except KeyError:
+        s = _ADDR_CACHE[addr] = f'${addr:04x}'
+        return s
 
-    def __str__(self):
-        return self.value
+# Index-register suffixes, kept as plain interned strings so formatting an
+# operand doesn't go through an enum __str__ call.
+INDEX_NONE, INDEX_X, INDEX_Y = '', 'x', 'y'
 
 class Bank:
     """
     A ROM bank.
     """
+    __slots__ = ('_bytes', 'base', 'number', 'components', '_fixed', 'dq_brk',
+                 '_by_pos', '_label_cache', '_len', '_source_offset')
+
     def __init__(self, number:int, base:int, _bytes:bytes, fixed:int=0, 
                  dq_brk:bool = False):
         """
@@ -171,49 +220,68 @@ class Bank:
         """
         if base < 0:
             raise ValueError("Bank address cannot be negative.")
+        # bytes() is free when the caller already passes bytes and copies
+        # once for memoryview input
         self._bytes = bytes(_bytes)
-        self.base = base if base else 0x8000
         self.number = number
+        self._len = len(self._bytes)
+        # where this bank's bytes start in the source file, used by the
+        # components when emitting source-position comments
+        self._source_offset = self._len * number
         self.components = []
         self._fixed = fixed
         self.dq_brk = dq_brk
-        self._disassemble(_bytes[:-6], _bytes[-6:])
-        i = 0
-        if not base:
-            old_base = self.base
-            new_base = self.find_base()
-            # use the jump addresses to guess the base address of this bank
-            if new_base != old_base:
-                # it changed, so redo the disassembly
-                self.base = new_base
-                self._disassemble(_bytes[:-6], _bytes[-6:])
+        self._label_cache = {}
+        # use the jump addresses to guess the base address of this bank;
+        # find_base only scans the raw bytes, so the bank is decoded once
+        self.base = base if base else self.find_base()
+        # a memoryview keeps the per-instruction slices in _disassemble from
+        # copying; Instruction only materializes the bytes it keeps
+        mv = memoryview(self._bytes)
+        self._disassemble(mv[:-6], mv[-6:])
         # generate any necessary labels
-        str(self)
+        self._add_labels()
 
     def _disassemble(self, bank_bytes:bytes, interrupts:bytes=bytes()):
         self.components.clear()
+        self._label_cache.clear()
+        # the address index is rebuilt once decoding finishes; until then
+        # find_component falls back to scanning the component list
+        self._by_pos = None
+        sizes = decode_bank(bank_bytes, self.dq_brk)
+        # track the open component and its completion state locally instead
+        # of re-checking type(components[-1]) / is_complete() for every byte
+        current = None
+        current_kind = -1
+        complete = False
         i = 0
         while i < len(bank_bytes):
-            instr = Instruction(i + self.base, self, bank_bytes[i:i+3], 
-                                self.dq_brk)
-            if instr:
-                if not len(self.components):
-                    self.components.append(Subroutine(self, instr.position))
-                elif type(self.components[-1]) is not Subroutine:
-                    self.components.append(Subroutine(self, instr.position))
-                elif self.components[-1].is_complete():
-                    self._merge_invalid()
-                    self.components.append(Subroutine(self, instr.position))
-                self.components[-1].append(instr)
-                i += len(instr)
+            size = sizes[i]
+            if size:
+                instr = Instruction(i + self.base, self, bank_bytes[i:i+3],
+                                    self.dq_brk)
+                if complete or current_kind != _KIND_SUB:
+                    if complete:
+                        self._merge_invalid()
+                    current = Subroutine(self, instr.position)
+                    current_kind = _KIND_SUB
+                    self.components.append(current)
+                current.append(instr)
+                complete = (instr.op in _SUB_END_OPS
+                        or (bool(Subroutine.valid_end)
+                            and current.is_complete()))
+                i += size
             else:
-                if not len(self.components):
-                    self.components.append(Table(i + self.base, self))
-                elif type(self.components[-1]) is Subroutine:
+                if current_kind == _KIND_SUB:
                     self._merge_invalid()
-                if type(self.components[-1]) is not Table:
-                    self.components.append(Table(i + self.base, self))
-                self.components[-1].append(bank_bytes[i])
+                    current = self.components[-1] if self.components else None
+                    current_kind = current.kind if current is not None else -1
+                if current_kind != _KIND_TAB:
+                    current = Table(i + self.base, self)
+                    current_kind = _KIND_TAB
+                    self.components.append(current)
+                current.append(bank_bytes[i])
+                complete = False
                 i += 1
         if len(interrupts):
             # no need to prefix the labels if there are fixed banks
@@ -226,7 +294,7 @@ class Bank:
                 self.components.append(reset)
                 self.components.append(irq)
             else:
-                if type(self.components[-1]) is Table:
+                if self.components[-1].kind == _KIND_TAB:
                     t = self.components[-1]
                 else:
                     t = Table(self.base + len(bank_bytes), self)
@@ -234,6 +302,16 @@ class Bank:
                 t.extend(nmi)
                 t.extend(reset)
                 t.extend(irq)
+        # index every covered address so find_component is a dict lookup
+        # instead of a scan over the component list
+        self._by_pos = {}
+        for c in self.components:
+            for addr in range(c.position, c.position + len(c)):
+                self._by_pos[addr] = c
+        # labels resolved mid-decode (e.g. by --sub-valid-end matching) may
+        # have cached forward references as bare addresses; drop them so the
+        # final render resolves against the finished component list
+        self._label_cache.clear()
 
 #      def _valid_interrupts(self, nmi, reset, irq):
 #          if nmi.addr < 0x8000 or reset.addr < 0x8000 or irq.addr < 0x8000:
@@ -242,14 +320,31 @@ class Bank:
 #              return False
 #          return True
 
+    def _add_labels(self):
+        """
+        Resolves the label for every referenced address so the labels exist
+        before the bank is rendered, without formatting a throwaway string.
+        """
+        for c in self.components:
+            if c.kind == _KIND_SUB:
+                for i in c.instructions:
+                    if i.type is OpType.BRANCH:
+                        self.find_label(i.dest)
+                    elif (i.type is OpType.ABSOLUTE and
+                            i.op not in _STORE_OPS):
+                        self.find_label(i.operand)
+            elif c.kind == _KIND_WORD:
+                self.find_label(c.addr)
+
     def _merge_invalid(self):
         if len(self.components):
             c = self.components[-1]
-            if type(c) is Subroutine and not c.is_valid():
+            if c.kind == _KIND_SUB and not c.is_valid():
                 self.components[-1] = Table(c.position, self, c)
-                while len(self.components) > 1 and type(self.components[-2]) is Table:
-                    self.components[-2].extend(self.components[-1])
-                    self.components = self.components[:-1]
+                while (len(self.components) > 1
+                        and self.components[-2].kind == _KIND_TAB):
+                    merged = self.components.pop()
+                    self.components[-1].extend(merged)
 
     def find_component(self, addr:int) -> Any:
         """
@@ -260,10 +355,12 @@ class Bank:
         :return: The requested component, or None if no instruction exists at
             that address.
         """
-        for c in self.components:
-            if addr >= c.position and addr < c.position + len(c):
-                return c
-        return None
+        if self._by_pos is None: # mid-decode: the index isn't built yet
+            for c in self.components:
+                if addr >= c.position and addr < c.position + len(c):
+                    return c
+            return None
+        return self._by_pos.get(addr)
 
 
     def find_label(self, addr:int) -> str:
@@ -276,52 +373,75 @@ class Bank:
         :return: The requested label, or a hex address if no component exists at
             that address.
         """
-        c = self.find_component(addr)
-        if c:
-            return f'{c.get_label(addr)}'
-        return f'${addr:04x}'
+        label = self._label_cache.get(addr)
+        if label is None:
+            c = self.find_component(addr)
+            if c:
+                label = f'{c.get_label(addr)}'
+            else:
+                label = addr_str(addr)
+            self._label_cache[addr] = label
+        return label
 
     def find_base(self):
         """
         Attempts to find the base address based on jump addresses in this bank.
         """
         bases = list(range(0x8000, 0x10001 - len(self) * self._fixed, len(self)))
-        if type(self.components[-1]) is not Word:
-            bases = bases[:-1] # no interrupt vectors, can't be the last bank
+        if self._fixed:
+            # with fixed banks the vector-holding bank gets its base
+            # explicitly in main(), so this one can't be last; with none,
+            # the last slot stays a candidate
+            bases = bases[:-1]
         bins = [0] * (len(bases) - 1)
-        for c in self.components:
-            if type(c) is Subroutine:
-                for i in c.instructions:
-                    if i.op in ('jmp', 'jsr') and i.type == OpType.ABSOLUTE:
-                        b1, b2, _ = bytes(i)
-                        jpoint = b2 << 8 | b1
-                        for i in range(len(bins)):
-                            if jpoint > bases[i] and jpoint < bases[i+1]:
-                                bins[i] += 1
-        base = 0
-        for i,b in enumerate(bins):
-            if bases[base] < bases[i]:
-                base = i
-        return bases[base]
+        # scan the raw bytes with the decode tables rather than walking the
+        # disassembled components; only absolute jmp/jsr targets are counted
+        buf = self._bytes
+        n = len(buf) - 6
+        i = 0
+        while i < n:
+            opcode = buf[i]
+            size = SIZE_TBL[opcode]
+            if size == 3 and (opcode == 0x20 or opcode == 0x4c) and i + 2 < n:
+                jpoint = buf[i+2] << 8 | buf[i+1]
+                j = bisect_right(bases, jpoint) - 1
+                if 0 <= j < len(bins) and jpoint != bases[j]:
+                    bins[j] += 1
+            i += size or 1
+        if not bins:
+            return bases[0]
+        return bases[max(range(len(bins)), key=bins.__getitem__)]
 
     def __len__(self):
-        return len(self._bytes)
+        return self._len
 
     def __bytes__(self):
         return self._bytes
 
+    def write_to(self, out):
+        """
+        Writes the assembly for this bank to a stream one component at a time,
+        avoiding a whole-bank string in memory.
+
+        :param out: The stream to write to.
+        """
+        out.write(f'.base ${self.base:04x}\n\n')
+        for c in self.components:
+            c.write_to(out)
+
     def __str__(self):
         buf = StringIO()
-        buf.write(f'.base ${self.base:04x}\n\n')
-        for c in self.components:
-            buf.write(str(c))
-        buf.seek(0)
-        return buf.read()
+        self.write_to(buf)
+        return buf.getvalue()
 
 class Instruction:
     """
     A single assembly instruction.
     """
+    __slots__ = ('position', 'opcode', 'bank', 'dq_brk', 'label', 'comment',
+                 'op', '_size', 'type', 'type_id', 'indexing', '_bytes',
+                 'b1', 'b2', 'operand', 'dest')
+
     def __init__(self, position:int, bank:Bank, _bytes:bytes,
                  dq_brk:bool = False):
         """
@@ -339,55 +459,31 @@ class Instruction:
         self.opcode = _bytes[0]
         self.bank = bank
         self.dq_brk = dq_brk
-        self._bytes = bytes(_bytes)
-        b1 = _bytes[1] if len(_bytes) > 1 else None
-        b2 = _bytes[2] if len(_bytes) > 2 else None
-        self._size = 0
         self.label = ''
-
-        self.op = ''
         self.comment = ''
-        self.indexing = Indexing.NONE
-
-        if b2 is not None and self.opcode == 0x6c:
-            self.type = OpType.INDIRECT
-            self.op = 'jmp'
-            self._size = 3
-
-        elif b2 is not None and self.opcode == 0x00:
-            self.type = OpType.IMPLIED
-            self.op = 'brk'
-            self._size = 2 if not dq_brk else 3
 
-        elif self.implied(self.opcode):
-            self.type = OpType.IMPLIED
-            self._size = 1
-
-        elif self.accumulator(self.opcode):
-            self.type = OpType.ACCUMULATOR
-            self._size = 1
-
-        elif b1 is not None and self.immediate(self.opcode):
-            self.type = OpType.IMMMEDIATE
-            self._size = 2
-
-        elif b1 is not None and self.zeropage(self.opcode):
-            self.type = OpType.ZEROPAGE
-            self._size = 2
-
-        elif b1 is not None and self.indirect(self.opcode):
-            self.type = OpType.INDIRECT
-            self._size = 2
-
-        elif b1 is not None and self.branch(self.opcode):
-            self.type = OpType.BRANCH
-            self._size = 2
-
-        elif b2 is not None and self.absolute(self.opcode):
-            self.type = OpType.ABSOLUTE
+        self.op, self._size, self.type, self.indexing = \
+                OPCODE_TABLE[self.opcode]
+        if self._size and len(_bytes) < MIN_BYTES_TBL[self.opcode]:
+            self.op = ''
+            self._size = 0
+            self.type = None
+            self.indexing = INDEX_NONE
+        elif self._size and not self.opcode and dq_brk:
             self._size = 3
-
-        self._bytes = self._bytes[:self._size]
+        self.type_id = self.type.value if self.type is not None else -1
+        self._bytes = bytes(_bytes[:self._size])
+        self.b1 = self._bytes[1] if self._size > 1 else None
+        self.b2 = self._bytes[2] if self._size > 2 else None
+        if self._size > 2:
+            self.operand = self.b2 << 8 | self.b1
+        else:
+            self.operand = self.b1
+        if self.type is OpType.BRANCH:
+            self.dest = position + 2 + (self.b1 if self.b1 < 128
+                                        else self.b1 - 256)
+        else:
+            self.dest = None
 
     def implied(self, opcode):
         """
@@ -399,15 +495,13 @@ class Instruction:
         :return: True if this opcode is for an implied instruction.
         """
         if opcode & 0xf == 0x8:
-            self.op = (( 'php', 'clc', 'plp', 'sec', 'pha', 'cli', 'pla', 'sei',
-                'dey', 'tya', 'tay', 'clv', 'iny', 'cld', 'inx', 'sed')
-                [opcode >> 4])
+            self.op = _MNEMONIC_FLAG[opcode >> 4]
         if opcode == 0x40:
             self.op = 'rti'
         if opcode == 0x60:
             self.op = 'rts'
         if opcode & 0x8f == 0x8a:
-            self.op = ('txa', 'txs', 'tax', 'tsx', 'dex', '', 'nop', '')[(opcode >> 4) - 8]
+            self.op = _MNEMONIC_TRANSFER[(opcode >> 4) - 8]
         if self.op:
             return True
         return False
@@ -422,19 +516,19 @@ class Instruction:
         :return: True if this opcode is for a zero page instruction.
         """
         if opcode & 0xf == 5:
-            self.op = ('ora', 'and', 'eor', 'adc', 'sta', 'lda', 'cmp', 'sbc')[opcode >> 5]
+            self.op = _MNEMONIC_ALU[opcode >> 5]
         if opcode & 0xf == 6:
-            self.op = ('asl', 'rol', 'lsr', 'ror', 'stx', 'ldx', 'dec', 'inc')[opcode >> 5]
+            self.op = _MNEMONIC_RMW[opcode >> 5]
         if opcode == 0x24:
             self.op = 'bit'
         if opcode in (0x84, 0x94, 0xa4, 0xb4, 0xc4, 0xe4):
-            self.op = ('sty', 'ldy', 'cpy', 'cpx')[(opcode >> 5) - 8]
+            self.op = _MNEMONIC_INDEX[(opcode >> 5) - 8]
 
         if self.op:
             if opcode & 0x10 == 0x10:
-                self.indexing = Indexing.X
+                self.indexing = INDEX_X
             if opcode in (0x96, 0xb6):
-                self.indexing = Indexing.Y
+                self.indexing = INDEX_Y
             return True
         return False
 
@@ -454,20 +548,20 @@ class Instruction:
         if opcode == 0x4c:
             self.op = 'jmp'
         if opcode & 0x1f == 0x19:
-            self.op = ('ora', 'and', 'eor', 'adc', 'sta', 'lda', 'cmp', 'sbc')[opcode >> 5]
+            self.op = _MNEMONIC_ALU[opcode >> 5]
         if opcode & 0xf == 0xd:
-            self.op = ('ora', 'and', 'eor', 'adc', 'sta', 'lda', 'cmp', 'sbc')[opcode >> 5]
+            self.op = _MNEMONIC_ALU[opcode >> 5]
         if opcode & 0xf == 0xe:
-            self.op = ('asl', 'rol', 'lsr', 'ror', 'stx', 'ldx', 'dec', 'inc')[opcode >> 5]
+            self.op = _MNEMONIC_RMW[opcode >> 5]
         if opcode == 0x2c:
             self.op = 'bit'
         if opcode in (0x8c, 0xac, 0xbc, 0xcc, 0xec):
-            self.op = ('sty', 'ldy', 'cpy', 'cpx')[(opcode >> 5) - 8]
+            self.op = _MNEMONIC_INDEX[(opcode >> 5) - 8]
         if self.op:
             if opcode & 0x10 == 0x10:
-                self.indexing = Indexing.X
+                self.indexing = INDEX_X
             if opcode == 0xbe or opcode & 0x1f == 0x19:
-                self.indexing = Indexing.Y
+                self.indexing = INDEX_Y
             return True
         return False
 
@@ -481,7 +575,7 @@ class Instruction:
         :return: True if this opcode is for a branch  instruction.
         """
         if opcode & 0x1f == 0x10:
-            self.op = ('bpl', 'bmi', 'bvc', 'bvs', 'bcc', 'bcs', 'bne', 'beq')[opcode >> 5]
+            self.op = _MNEMONIC_BRANCH[opcode >> 5]
             return True
         return False
 
@@ -495,7 +589,7 @@ class Instruction:
         :return: True if this opcode is for an accumulator instruction.
         """
         if opcode & 0x9f == 0x0a:
-            self.op = ('asl', 'rol', 'lsr', 'ror')[opcode >> 5]
+            self.op = _MNEMONIC_RMW[opcode >> 5]
             return True
         return False
 
@@ -509,9 +603,9 @@ class Instruction:
         :return: True if this opcode is for an immediate instruction.
         """
         if opcode & 0x1f == 0x09:
-            self.op = ('ora', 'and', 'eor', 'adc', '', 'lda', 'cmp', 'sbc')[opcode >> 5]
+            self.op = _MNEMONIC_ALU_IMM[opcode >> 5]
         if opcode & 0x9f == 0x80:
-            self.op = ('', 'ldy', 'cpy', 'cpx')[(opcode >> 5) - 8]
+            self.op = _MNEMONIC_INDEX_IMM[(opcode >> 5) - 8]
         if opcode == 0xa2:
             self.op = 'ldx'
         if self.op:
@@ -528,8 +622,8 @@ class Instruction:
         :return: True if this opcode is for an indirect  instruction.
         """
         if opcode & 0xf == 1:
-            self.op = ('ora', 'and', 'eor', 'adc', 'sta', 'lda', 'cmp', 'sbc')[opcode >> 5]
-            self.indexing = Indexing.Y if (opcode >> 4) & 1 else Indexing.X
+            self.op = _MNEMONIC_ALU[opcode >> 5]
+            self.indexing = INDEX_Y if (opcode >> 4) & 1 else INDEX_X
             return True
         return False
 
@@ -558,88 +652,73 @@ class Instruction:
     def __str__(self):
         if not self.op:
             return ''
-        source_pos = self.position % len(self.bank)
-        source_pos += len(self.bank) * self.bank.number
-        b1 = self._bytes[1] if len(self._bytes) > 1 else None
-        b2 = self._bytes[2] if len(self._bytes) > 2 else None
-        buf = StringIO()
-        if self.comment:
-            buf.write(' ' * 10)
-            buf.write(f'; {self.comment}\n')
-        line_len = buf.tell()
+        bank = self.bank
+        source_pos = self.position % bank._len + bank._source_offset
+        b1 = self.b1
+        b2 = self.b2
+        comment = f'{" " * 10}; {self.comment}\n' if self.comment else ''
         if self.label:
-            buf.write(f'{self.label}:'.ljust(12))
+            label = f'{self.label}:'.ljust(12)
         else:
-            buf.write(' ' * 12)
+            label = ' ' * 12
 
         if not self.opcode: #brk instruction
-            buf.write(self.op)
-            buf.write(' ' * 25)
-            buf.write(f'; {source_pos:05X}:  00\n')
-            buf.write(' ' * 12)
             if not self.dq_brk:
-                buf.write(f'hex {b1:02x}')
-                buf.write(' ' * 22)
-                buf.write(f'; {source_pos+1:05X}:  {b1:02x}\n')
-            else:
-                buf.write(f'hex {b1:02x} {b2:02x}')
-                buf.write(' ' * 19)
-                buf.write(f'; {source_pos+1:05X}:  {b1:02x} {b2:02x}\n')
-            buf.seek(0)
-            return buf.read()
-
-        if self.type == OpType.IMPLIED:
-            buf.write(self.op)
-
-        if self.type == OpType.ACCUMULATOR:
-            buf.write(f'{self.op} a')
-
-        if self.type == OpType.IMMMEDIATE:
-                buf.write(f'{self.op} #${b1:02x}')
-        if self.type == OpType.BRANCH:
-            dest = self.position + 2 + (b1 if b1 < 128 else b1 - 256)
-            buf.write(f'{self.op} {self.bank.find_label(dest)}')
-
-        if self.type == OpType.ZEROPAGE:
-            if self.indexing == Indexing.NONE:
-                buf.write(f'{self.op} ${b1:02x}')
+                tail = (f'{" " * 12}hex {HEX256[b1]}{" " * 22}'
+                        f'; {source_pos+1:05X}:  {HEX256[b1]}\n')
             else:
-                buf.write(f'{self.op} ${b1:02x},{self.indexing}')
-        if self.type == OpType.ABSOLUTE:
-            addr = (b2 << 8) | b1
-            if self.op in ('sta', 'stx', 'sty', 'dec', 'inc'):
-                label = f'${addr:04x}'
-            else:
-                label = self.bank.find_label(addr)
-            if addr in mmio:
-                buf.write(f'{self.op} {mmio[addr]}')
-            else:
-                buf.write(f'{self.op} {label}')
-            if self.indexing != Indexing.NONE:
-                buf.write(f',{self.indexing}')
-            if not b2 and self.op not in ('jmp', 'jsr'):
-                buf.seek(12)
-                op_comment = buf.read()
-                buf.seek(12)
-                buf.write(f'hex {self.opcode:02x} {b1:02x} {b2:02x} ; {op_comment}')
-
-        if self.type == OpType.INDIRECT:
-            if self.op == 'jmp':
-                buf.write(f'{self.op} (${b2:02x}{b1:02x})')
-            elif self.indexing == Indexing.NONE:
-                buf.write(f'{self.op} ${b1:02x}')
-            elif self.indexing == Indexing.X:
-                buf.write(f'{self.op} (${b1:02x},x)')
-            elif self.indexing == Indexing.Y:
-                buf.write(f'{self.op} (${b1:02x}),y')
-
-        buf.write(' ' * (40 + line_len - buf.tell()))
-        buf.write(f'; {source_pos:05X}:  ')
-        buf.write(' '.join([f'{x:02x}' for x in self._bytes]))
-        buf.write('\n')
+                tail = (f'{" " * 12}hex {HEX256[b1]} {HEX256[b2]}{" " * 19}'
+                        f'; {source_pos+1:05X}:  {HEX256[b1]} {HEX256[b2]}\n')
+            return (f'{comment}{label}{self.op}{" " * 25}'
+                    f'; {source_pos:05X}:  00\n{tail}')
 
-        buf.seek(0)
-        return buf.read()
+        text = FORMATTERS[self.type_id](self, b1, b2)
+        byte_string = self._bytes.hex(' ')
+        return (f'{comment}{label}{text}{" " * (28 - len(text))}'
+                f'; {source_pos:05X}:  {byte_string}\n')
+
+    def _implied_str(self, b1, b2):
+        return self.op
+
+    def _accumulator_str(self, b1, b2):
+        return f'{self.op} a'
+
+    def _immediate_str(self, b1, b2):
+        return f'{self.op} #${HEX256[b1]}'
+
+    def _branch_str(self, b1, b2):
+        return f'{self.op} {self.bank.find_label(self.dest)}'
+
+    def _zeropage_str(self, b1, b2):
+        if not self.indexing:
+            return f'{self.op} ${HEX256[b1]}'
+        return f'{self.op} ${HEX256[b1]},{self.indexing}'
+
+    def _absolute_str(self, b1, b2):
+        addr = self.operand
+        if self.op in _STORE_OPS:
+            label_text = addr_str(addr)
+        else:
+            label_text = self.bank.find_label(addr)
+        name = _MMIO_TAB[addr - 0x2000] if 0x2000 <= addr < 0x4020 else None
+        if name:
+            text = f'{self.op} {name}'
+        else:
+            text = f'{self.op} {label_text}'
+        if self.indexing:
+            text += f',{self.indexing}'
+        if not b2 and self.op not in _JUMP_OPS:
+            text = f'hex {HEX256[self.opcode]} {HEX256[b1]} {HEX256[b2]} ; {text}'
+        return text
+
+    def _indirect_str(self, b1, b2):
+        if self.op == 'jmp':
+            return f'{self.op} (${HEX256[b2]}{HEX256[b1]})'
+        if not self.indexing:
+            return f'{self.op} ${HEX256[b1]}'
+        if self.indexing is INDEX_X:
+            return f'{self.op} (${HEX256[b1]},x)'
+        return f'{self.op} (${HEX256[b1]}),y'
 
     def __add__(self, instr):
         s = Subroutine(self.bank, self.position)
@@ -647,10 +726,100 @@ class Instruction:
         s.append(instr)
         return s
 
+def _build_opcode_tables():
+    """
+    Resolves every classifier result for all 256 opcodes. Each result is a
+    pure function of the opcode, so this only needs to run once at import.
+
+    :return: A 256-entry tuple of (op, size, type, indexing) quadruples, with
+        op '' and size 0 for invalid opcodes, and parallel 256-entry tuples
+        of instruction size and the minimum number of bytes which must be
+        available for the opcode to decode.
+    """
+    table = []
+    sizes = []
+    min_bytes = []
+    for opcode in range(256):
+        instr = object.__new__(Instruction)
+        instr.op = ''
+        instr.indexing = INDEX_NONE
+        op_type = None
+        size = 0
+        if opcode == 0x6c:
+            instr.op = 'jmp'
+            op_type = OpType.INDIRECT
+            size = 3
+        elif opcode == 0x00:
+            instr.op = 'brk'
+            op_type = OpType.IMPLIED
+            size = 2
+        elif instr.implied(opcode):
+            op_type = OpType.IMPLIED
+            size = 1
+        elif instr.accumulator(opcode):
+            op_type = OpType.ACCUMULATOR
+            size = 1
+        elif instr.immediate(opcode):
+            op_type = OpType.IMMMEDIATE
+            size = 2
+        elif instr.zeropage(opcode):
+            op_type = OpType.ZEROPAGE
+            size = 2
+        elif instr.indirect(opcode):
+            op_type = OpType.INDIRECT
+            size = 2
+        elif instr.branch(opcode):
+            op_type = OpType.BRANCH
+            size = 2
+        elif instr.absolute(opcode):
+            op_type = OpType.ABSOLUTE
+            size = 3
+        table.append((instr.op, size, op_type, instr.indexing))
+        sizes.append(size)
+        # brk and indirect jmp check the third byte even though brk only
+        # consumes two
+        min_bytes.append(3 if opcode in (0x00, 0x6c) else size)
+    return tuple(table), tuple(sizes), tuple(min_bytes)
+
+OPCODE_TABLE, SIZE_TBL, MIN_BYTES_TBL = _build_opcode_tables()
+
+# Cheap first-stage filter for the decode loop: 1 where the opcode can start
+# an instruction at all, 0 where it can only be data.
+VALID_OPCODE = bytes(1 if size else 0 for size in SIZE_TBL)
+
+# Operand formatters indexed by OpType value, so Instruction.__str__ does one
+# table dispatch instead of seven enum comparisons.
+FORMATTERS = (Instruction._implied_str, Instruction._immediate_str,
+              Instruction._accumulator_str, Instruction._branch_str,
+              Instruction._zeropage_str, Instruction._absolute_str,
+              Instruction._indirect_str)
+
+def decode_bank(bank_bytes:bytes, dq_brk:bool=False) -> list:
+    """
+    Classifies every byte position in a bank in a single pass using the
+    precomputed opcode tables.
+
+    :param bank_bytes: The bytes of the bank to classify.
+    :param dq_brk: Treat brk instructions as 3 bytes instead of 2.
+
+    :return: A list of instruction sizes parallel to bank_bytes, with 0 for
+        positions which do not start a valid instruction.
+    """
+    n = len(bank_bytes)
+    sizes = [0] * n
+    for i in range(n):
+        opcode = bank_bytes[i]
+        if VALID_OPCODE[opcode] and i + MIN_BYTES_TBL[opcode] <= n:
+            sizes[i] = 3 if dq_brk and not opcode else SIZE_TBL[opcode]
+    return sizes
+
 class Subroutine:
     """
     An assembly subroutine.
     """
+    __slots__ = ('position', 'instructions', 'bank', '_len', '_positions')
+
+    kind = _KIND_SUB
     valid_end:list = []
     always_valid:bool = False
     min_size:int = 2
@@ -661,6 +830,8 @@ class Subroutine:
         self.position = position
         self.instructions = []
         self.bank = bank
+        self._len = 0
+        self._positions = []
 
     def is_complete(self):
         """
@@ -669,11 +840,13 @@ class Subroutine:
         executing invalid code.
         """
         last_instr = self.instructions[-1]
-        if last_instr.op in ('rts', 'rti', 'jmp'):
+        if last_instr.op in _SUB_END_OPS:
             return True
-        for v in Subroutine.valid_end:
-            if v in str(last_instr):
-                return True
+        if Subroutine.valid_end:
+            last_str = str(last_instr)
+            for v in Subroutine.valid_end:
+                if v in last_str:
+                    return True
         return False
 
     def is_valid(self):
@@ -693,35 +866,48 @@ class Subroutine:
         :param instruction: The instruction to append.
         """
         self.instructions.append(instruction)
+        self._positions.append(instruction.position)
+        self._len += len(instruction)
 
     def get_label(self, addr):
-        for i in self.instructions:
-            if addr >= i.position and addr < i.position + len(i):
+        idx = bisect_right(self._positions, addr) - 1
+        if idx >= 0:
+            i = self.instructions[idx]
+            if addr < i.position + len(i):
                 return i.get_label(addr)
 
     def __bytes__(self):
-        ret = bytes()
-        for i in self.instructions:
-            ret += bytes(i)
-        return ret
+        return b''.join([bytes(i) for i in self.instructions])
 
     def __len__(self):
-        return sum([len(i) for i in self.instructions])
+        return self._len
 
-    def __str__(self):
-        buf = StringIO()
+    def write_to(self, out):
+        """
+        Writes the assembly for this subroutine to a stream.
+
+        :param out: The stream to write to.
+        """
         for i in self.instructions:
-            buf.write(str(i))
-        buf.write('\n')
-        buf.seek(0)
-        return buf.read()
+            out.write(str(i))
+        out.write('\n')
+
+    def __str__(self):
+        return ''.join([str(i) for i in self.instructions]) + '\n'
 
 class Table:
     """
     A table of bytes containing data.
     """
+    __slots__ = ('_bytes', 'position', 'bank', 'label')
+
+    kind = _KIND_TAB
+
     def __init__(self, position:int, bank:Bank, _bytes:bytes=bytes()):
-        self._bytes = bytes(_bytes)
+        if isinstance(_bytes, (bytes, bytearray, memoryview)):
+            self._bytes = bytearray(_bytes)
+        else: # anything else with __bytes__, e.g. an invalid Subroutine
+            self._bytes = bytearray(bytes(_bytes))
         self.position = position
         self.bank = bank
         self.label = ''
@@ -732,14 +918,14 @@ class Table:
 
         :param byte: The byte to append
         """
-        self._bytes += bytes((byte,))
+        self._bytes.append(byte)
 
     def extend(self, _bytes):
         """
         Appends several bytes to this table. This can be any type which supports
         the __bytes__ method.
         """
-        self._bytes += bytes(_bytes)
+        self._bytes.extend(bytes(_bytes))
 
     def get_label(self, addr):
         """
@@ -754,29 +940,29 @@ class Table:
         return f'{self.label}{offset}'
 
     def __bytes__(self):
-        return self._bytes
+        return bytes(self._bytes)
 
-    def __str__(self):
-        buf = StringIO()
-        source_pos = self.position % len(self.bank)
-        source_pos += len(self.bank) * self.bank.number
+    def write_to(self, out):
+        """
+        Writes the assembly for this table to a stream one row at a time.
+
+        :param out: The stream to write to.
+        """
+        bank = self.bank
+        source_pos = self.position % bank._len + bank._source_offset
         if self.label:
-            buf.write(f'{self.label}: ')
-            buf.write(f'; {len(self)} bytes\n')
-        last_line = buf.tell()
+            out.write(f'{self.label}: ; {len(self)} bytes\n')
+        hexstr = self._bytes.hex(' ')
         for i in range(0, len(self._bytes), 8):
-            byte_string = f'{" ".join([f"{x:02x}" for x in self._bytes[i:i+8]])}'
-            buf.write(' ' * 12)
-            buf.write('hex ')
-            buf.write(byte_string)
-            buf.write(' ' * (40 + last_line - buf.tell()))
-            buf.write(f'; {source_pos + i:05X}:  ')
-            buf.write(byte_string)
-            buf.write('\n')
-            last_line = buf.tell()
-        buf.write('\n')
-        buf.seek(0)
-        return buf.read()
+            byte_string = hexstr[i*3:i*3 + 23]
+            out.write(f'{" " * 12}hex {byte_string:<24}'
+                      f'; {source_pos + i:05X}:  {byte_string}\n')
+        out.write('\n')
+
+    def __str__(self):
+        buf = StringIO()
+        self.write_to(buf)
+        return buf.getvalue()
 
     def __len__(self):
         return len(self._bytes)
@@ -786,6 +972,10 @@ class Word:
     An assembly  WORD. This is only used for NMI, RESET, and IRQ vectors in the
     disassembler.
     """
+    __slots__ = ('position', 'bank', 'b1', 'b2', 'addr', 'comment', 'label')
+
+    kind = _KIND_WORD
+
     def __init__(self, position, bank, b1, b2, label='', comment=''):
         self.position = position
         self.bank = bank
@@ -802,32 +992,36 @@ class Word:
 
         :return: The instruction label
         """
-        if label:
+        if self.label:
             offset = ''
             if addr != self.position:
                 offset = f'+{addr - self.position}'
             return f'{self.label}{offset}'
-        return f'${addr:04x}'
+        return addr_str(addr)
 
 
     def __bytes__(self):
         return bytes((self.b1, self.b2))
 
+    def write_to(self, out):
+        """
+        Writes the assembly for this word to a stream.
+
+        :param out: The stream to write to.
+        """
+        out.write(str(self))
+
     def __str__(self):
-        source_pos = self.position % len(self.bank)
-        source_pos += len(self.bank) * self.bank.number
-        buf = StringIO()
+        bank = self.bank
+        source_pos = self.position % bank._len + bank._source_offset
         if self.label:
-            buf.write(f'{self.label}:'.ljust(12))
+            label = f'{self.label}:'.ljust(12)
         else:
-            buf.write(' ' * 12)
-        buf.write(f'word {self.bank.find_label(self.addr)}'.ljust(28))
-        buf.write(f'; {source_pos:05X}: {self.b1:02x} {self.b2:02x}')
-        if self.comment:
-            buf.write(f'     {self.comment}')
-        buf.write('\n')
-        buf.seek(0)
-        return buf.read()
+            label = ' ' * 12
+        word = f'word {bank.find_label(self.addr)}'.ljust(28)
+        comment = f'     {self.comment}' if self.comment else ''
+        return (f'{label}{word}; {source_pos:05X}: '
+                f'{HEX256[self.b1]} {HEX256[self.b2]}{comment}\n')
 
     def __len__(self):
         return 2
@@ -841,15 +1035,16 @@ class Header:
         self._prg_size = _bytes[4] * 16
         self._chr_size = _bytes[5] *  8
         self._mapper = (_bytes[6] >> 4) | (_bytes[7] & 0xf0)
+        # the padding bytes are never rewritten, so format them once
+        self._pad_str = ', '.join([f'${x:02X}' for x in self._bytes[11:16]])
 
     def mapper(self, number:int=None):
         if number is None:
             return self._mapper
         self._mapper = number
-        self._bytes[6] &= 0xf
-        self._bytes[6] |= (number & 0xf) << 4
-        self._bytes[7] &= 0xf
-        self._bytes[7] |= number & 0xf0
+        b = self._bytes
+        b[6] = (b[6] & 0xf) | ((number & 0xf) << 4)
+        b[7] = (b[7] & 0xf) | (number & 0xf0)
 
     def prg_size(self, size:int=None):
         if size is None:
@@ -864,32 +1059,53 @@ class Header:
         self._bytes[5] = size // 8
 
     def __str__(self):
-        buf = StringIO()
         if self._mapper in mappers:
-            buf.write(f';  HEADER - MAPPER {self._mapper} - {mappers[self._mapper][0]}\n')
+            title = f';  HEADER - MAPPER {self._mapper} - {mappers[self._mapper][0]}\n'
         else:
-            buf.write(f';  HEADER - MAPPER {self._mapper}\n')
-        buf.write( '        .db "NES", $1a\n')
-        buf.write(f'        .db {self._bytes[ 4]:d}  ; PRG ROM banks\n')
-        buf.write(f'        .db {self._bytes[ 5]:d}  ; CHR ROM banks\n')
-        buf.write(f'        .db ${self._bytes[ 6]:02x} ; Mapper, mirroring, battery, trainer\n')
-        buf.write(f'        .db ${self._bytes[ 7]:02x} ; Mapper, VS/Playchoice, NES 2.0 Header\n')
-        buf.write(f'        .db {self._bytes[ 8]:d}  ; PRG-RAM size (rarely used)\n')
-        buf.write(f'        .db {self._bytes[ 9]:d}  ; TV system (rarely used)\n')
-        buf.write(f'        .db {self._bytes[10]:d}  ; TV system, PRG-RAM presense (unofficial, rarely used)\n')
-        buf.write(' ' * 8)
-        buf.write(f'.db ' + ', '.join([f'${x:02X}' for x in self._bytes[11:16]]) + ' ; Unused padding')
-        buf.seek(0)
-        return buf.read()
+            title = f';  HEADER - MAPPER {self._mapper}\n'
+        return (title +
+             '        .db "NES", $1a\n'
+            f'        .db {self._bytes[ 4]:d}  ; PRG ROM banks\n'
+            f'        .db {self._bytes[ 5]:d}  ; CHR ROM banks\n'
+            f'        .db ${self._bytes[ 6]:02x} ; Mapper, mirroring, battery, trainer\n'
+            f'        .db ${self._bytes[ 7]:02x} ; Mapper, VS/Playchoice, NES 2.0 Header\n'
+            f'        .db {self._bytes[ 8]:d}  ; PRG-RAM size (rarely used)\n'
+            f'        .db {self._bytes[ 9]:d}  ; TV system (rarely used)\n'
+            f'        .db {self._bytes[10]:d}  ; TV system, PRG-RAM presense (unofficial, rarely used)\n'
+            f'        .db {self._pad_str} ; Unused padding')
 
     def __bytes__(self):
         return bytes(self._bytes)
 
+# The MMIO EQU block never changes, so render it once at import.
+_MMIO_ASM = ''.join([f'        {item:10s} EQU ${addr:04x}\n'
+                     for addr, item in mmio.items()])
+
+def _init_bank_worker(always_valid, valid_end, min_size):
+    """
+    Applies the command-line subroutine settings in a ProcessPoolExecutor
+    worker. Needed where the pool spawns fresh interpreters instead of
+    forking, since the settings live on the Subroutine class.
+    """
+    Subroutine.always_valid = always_valid
+    Subroutine.valid_end = valid_end
+    Subroutine.min_size = min_size
+
+def _disassemble_bank(bank_args):
+    """
+    Disassembles a single bank. Kept at module level so ProcessPoolExecutor
+    workers can pickle it.
+
+    :param bank_args: The positional arguments for the Bank constructor.
+
+    :return: The assembly text for the bank.
+    """
+    return str(Bank(*bank_args))
+
 def write_base_asm(header, out=stdout):
     out.write(f'{header}\n\n')
     out.write(';  MMIO\n')
-    for addr,item in mmio.items():
-        out.write(f'        {item:10s} EQU ${addr:04x}\n')
+    out.write(_MMIO_ASM)
     out.write('\n')
 
 def main():
@@ -916,7 +1132,7 @@ def main():
             inl.dump_and_verify(buf)
         except inlretro.HashMismatchError as e:
             stderr.write(f'{e}\n')
-            sys.exit(-1)
+            exit(-1)
         except inlretro.UnknownHashError as e:
             stderr.write(f'{e}\n')
         buf.seek(0)
@@ -928,8 +1144,16 @@ def main():
             exit(-1)
         buf = open(args.filename, 'rb')
     with buf as f:
+        try:
+            # map the whole ROM and hand out zero-copy views per bank
+            rom_data = memoryview(mmap.mmap(f.fileno(), 0,
+                                            access=mmap.ACCESS_READ))
+        except (OSError, ValueError): # not a real file (e.g. an INLRetro dump)
+            rom_data = memoryview(f.read())
+        offset = 0
         if not args.no_header:
-            header = Header(f.read(16))
+            header = Header(bytes(rom_data[:16]))
+            offset = 16
         else:
             header = Header()
         if args.mapper:
@@ -938,31 +1162,36 @@ def main():
             header.prg_size(args.prg_size)
         if args.chr_size:
             header.chr_size(args.chr_size)
+        mapper_id = header.mapper()
+        mapper_info = mappers.get(mapper_id)
+        prg_size = header.prg_size()
+        chr_size = header.chr_size()
         if bank_size < 0:
-            if header.mapper() in mappers:
-                bank_size = mappers[header.mapper()][1] * 1024
-                stderr.write(f'ROM uses mapper {header.mapper()} '
-                    f'- {mappers[header.mapper()][0]}\n')
+            if mapper_info:
+                bank_size = mapper_info[1] * 1024
+                stderr.write(f'ROM uses mapper {mapper_id} '
+                    f'- {mapper_info[0]}\n')
         if bank_size < 0:
-            stderr.write(f'Unknown mapper {header.mapper()}, please specify bank size.\n')
+            stderr.write(f'Unknown mapper {mapper_id}, please specify bank size.\n')
             exit(-1)
         stderr.write(f'Bank size: {bank_size//1024}KB\n')
         if fixed_banks < 0:
-            if header.mapper() in mappers:
-                fixed_banks = mappers[header.mapper()][2]
+            if mapper_info:
+                fixed_banks = mapper_info[2]
             else:
                 fixed_banks = 0
-        bank_count = header.prg_size() * 1024 // bank_size
-        stderr.write(f'ROM has {bank_count} PRG banks ({header.prg_size()}KB).\n')
-        chr_rom_count = header.chr_size() // 8
-        stderr.write(f'ROM has {chr_rom_count} CHR banks ({header.chr_size()}KB).\n')
+        bank_count = prg_size * 1024 // bank_size
+        stderr.write(f'ROM has {bank_count} PRG banks ({prg_size}KB).\n')
+        chr_rom_count = chr_size // 8
+        stderr.write(f'ROM has {chr_rom_count} CHR banks ({chr_size}KB).\n')
         stderr.write(f'Mapper uses {fixed_banks} fixed banks.\n')
         fixed_bank_start = bank_count - fixed_banks
         if args.info:
             return
 
         for i in range(bank_count):
-            rom = f.read(bank_size)
+            rom = rom_data[offset:offset + bank_size]
+            offset += bank_size
             if args.bank >= 0 and i != args.bank:
                 continue
             base = 0
@@ -970,8 +1199,18 @@ def main():
                 base = 0x8000
             elif i >= fixed_bank_start:
                 base = 0x10000 - (bank_size * (bank_count - i))
-            banks.append(Bank(i, base, rom, fixed_banks, args.dq_brk))
-        incbin = f.read()
+            banks.append((i, base, bytes(rom), fixed_banks, args.dq_brk))
+        incbin = bytes(rom_data[offset:])
+    # each bank is an independent 8-32K slice, so disassemble them in
+    # parallel across cores when there is more than one
+    if len(banks) > 1:
+        with ProcessPoolExecutor(initializer=_init_bank_worker,
+                initargs=(Subroutine.always_valid, Subroutine.valid_end,
+                          Subroutine.min_size)) as ex:
+            bank_strs = list(ex.map(_disassemble_bank, banks))
+    else:
+        bank_strs = [_disassemble_bank(b) for b in banks]
+    bank_numbers = [b[0] for b in banks]
     main_asm = stdout
     if args.bank >= 0:
         main_asm = open(os.devnull, 'w')
@@ -981,15 +1220,17 @@ def main():
     write_base_asm(header, main_asm)
 
     if args.stdout:
-        for b in banks:
-            stdout.write(str(b))
+        for bank_str in bank_strs:
+            stdout.write(bank_str)
             stdout.write('\n\n')
     else:
-        for b in banks:
-            with open(f'bank_{b.number:02d}.asm', 'w') as asm:
-                asm.write(str(b))
-                main_asm.write(f'        .include bank_{b.number:02d}.asm\n')
-    if not args.no_chr and not args.stdout and header.chr_size:
+        for number, bank_str in zip(bank_numbers, bank_strs):
+            with open(f'bank_{number:02d}.asm', 'w') as asm:
+                asm.write(bank_str)
+        main_asm.write(''.join([f'        .include bank_{number:02d}.asm\n'
+                                for number in bank_numbers]))
+    if (not args.no_chr and not args.stdout and header.chr_size() > 0
+            and incbin):
         with open('chr_rom.bin', 'wb') as chr_rom:
             chr_rom.write(incbin)
         main_asm.write('        .incbin chr_rom.bin\n')
@@ -1,22 +1,18 @@
 #!/usr/bin/env python3
+import os
 import sys
-import math
+import struct
+from array import array
 from enum import Enum
 from io import BytesIO
 from hashlib import md5
+try:
+    from hashlib import file_digest
+except ImportError: # Python < 3.11
+    file_digest = None
 
 from hashdb import known_md5
 
-class Singleton(type):
-    """
-    A metaclass used to create a Singleton class
-    """
-    _instances = {}
-    def __call__(cls, *args, **kwargs):
-        if cls not in cls._instances:
-            cls._instances[cls] = super(Singleton, cls).__call__(*args, **kwargs)
-        return cls._instances[cls]
-
 try:
     import usb.core
     import usb.util
@@ -44,6 +40,13 @@ class OpType(Enum):
     FWUPDATE = 16
     STUFF    = 17
 
+# Raw wRequest codes for do(), resolved once instead of reading
+# OpType.X.value on every transfer.
+OP_IO = OpType.IO.value
+OP_NES = OpType.NES.value
+OP_BUFFER = OpType.BUFFER.value
+OP_OPER = OpType.OPER.value
+
 class IO(Enum):
     def __call__(self, data:int=0):
         return (self.value | (data << 8)) & 0xffff
@@ -202,19 +205,40 @@ class Buffer(Enum):
     BUFF_PAYLOAD6            = 0xF6
     BUFF_PAYLOAD7            = 0xF7
 
+# Precomputed operation words for the fixed-argument transfers, so the init
+# sequences and the dump hot path skip an Enum.__call__ per packet.
+IO_RESET_OP = IO.IO_RESET()
+NES_INIT_OP = IO.NES_INIT()
+RAW_BUFFER_RESET_OP = Buffer.RAW_BUFFER_RESET()
+ALLOCATE_BUFFER0_OP = Buffer.ALLOCATE_BUFFER0(4)
+ALLOCATE_BUFFER1_OP = Buffer.ALLOCATE_BUFFER1(4)
+SET_RELOAD_PAGENUM0_OP = Buffer.SET_RELOAD_PAGENUM0(1)
+SET_RELOAD_PAGENUM1_OP = Buffer.SET_RELOAD_PAGENUM1(1)
+SET_MEM_N_PART0_OP = Buffer.SET_MEM_N_PART(0)
+SET_MEM_N_PART1_OP = Buffer.SET_MEM_N_PART(1)
+SET_MAP_N_MAPVAR0_OP = Buffer.SET_MAP_N_MAPVAR(0)
+SET_MAP_N_MAPVAR1_OP = Buffer.SET_MAP_N_MAPVAR(1)
+GET_CUR_BUFF_STATUS_OP = Buffer.GET_CUR_BUFF_STATUS()
+BUFF_PAYLOAD_OP = Buffer.BUFF_PAYLOAD()
+
+# Bank-switch control words, fully evaluated for every possible data byte so
+# the per-bank paths index a tuple instead of calling Enum.__call__.
+_CPU_WR_OPS = tuple(NES.NES_CPU_WR(b) for b in range(256))
+_MMC1_WR_OPS = tuple(NES.NES_MMC1_WR(b) for b in range(256))
+
 class Mapper:
-    def __init__(self):
+    def __init__(self, inl):
         self.number = 0
         self.name = type(self).__name__
         self.bank_size = 32
         self.chr_bank_size = 8
         self.prg_addr = 0
         self.chr_addr = 0
+        # bind the device operation directly so per-bank switches skip the
+        # INLRetro() singleton dispatch
+        self.do = inl.do
         self._post_init()
 
-    def do(self, *args):
-        INLRetro().do(*args)
-
     def _post_init(self):
         pass
 
@@ -233,15 +257,15 @@ class SxROM(Mapper):
         self.prg_addr = 0xffff
         self.chr_addr = 0xbfff
         # initialize the mapper chip
-        self.do(OpType.NES, NES.NES_MMC1_WR(0x1c), 0x9fff, 1)
+        self.do(OP_NES, _MMC1_WR_OPS[0x1c], 0x9fff, 1)
 
     def set_prg_bank(self, bank):
         sys.stderr.write(f"Swapping in PRG bank {bank}...\n")
-        self.do(OpType.NES, NES.NES_MMC1_WR(bank), self.prg_addr, 1)
+        self.do(OP_NES, _MMC1_WR_OPS[bank], self.prg_addr, 1)
 
     def set_chr_bank(self, bank):
         sys.stderr.write(f"Swapping in CHR bank {bank}...\n")
-        self.do(OpType.NES, NES.NES_MMC1_WR(bank), self.chr_addr, 1)
+        self.do(OP_NES, _MMC1_WR_OPS[bank], self.chr_addr, 1)
 
 class UxROM(Mapper):
     banks = (16, 8)
@@ -250,7 +274,7 @@ class UxROM(Mapper):
 
     def set_prg_bank(self, bank):
         sys.stderr.write(f"Swapping in PRG bank {bank}...\n")
-        self.do(OpType.NES, NES.NES_CPU_WR(bank), self.prg_addr, 1)
+        self.do(OP_NES, _CPU_WR_OPS[bank], self.prg_addr, 1)
 
 class CNROM(Mapper):
     banks = (32, 8)
@@ -259,36 +283,36 @@ class CNROM(Mapper):
 
     def set_chr_bank(self, bank):
         sys.stderr.write(f"Swapping in CHR bank {bank}...\n")
-        self.do(OpType.NES, NES.NES_CPU_WR(bank), self.chr_addr, 1)
+        self.do(OP_NES, _CPU_WR_OPS[bank], self.chr_addr, 1)
 
 class TxROM(Mapper):
     banks = (8, 1)
 
     def set_prg_bank(self, bank):
         sys.stderr.write(f"Swapping in PRG bank {bank}...\n")
-        self.do(OpType.NES, NES.NES_CPU_WR(0b10000110), 0x9ffe, 1)
-        self.do(OpType.NES, NES.NES_CPU_WR(bank), 0x9fff, 1)
+        self.do(OP_NES, _CPU_WR_OPS[0b10000110], 0x9ffe, 1)
+        self.do(OP_NES, _CPU_WR_OPS[bank], 0x9fff, 1)
 
     def set_chr_bank(self, bank):
         sys.stderr.write(f"Swapping in CHR bank {bank}...\n")
-        self.do(OpType.NES, NES.NES_CPU_WR(0b10000010), 0x9ffe, 1)
-        self.do(OpType.NES, NES.NES_CPU_WR(bank), 0x9fff, 1)
+        self.do(OP_NES, _CPU_WR_OPS[0b10000010], 0x9ffe, 1)
+        self.do(OP_NES, _CPU_WR_OPS[bank], 0x9fff, 1)
 
 class ExROM(Mapper):
     banks = (8, 1)
     def set_prg_bank(self, bank):
         sys.stderr.write(f"Swapping in PRG bank {bank}...\n")
-        self.do(OpType.NES, NES.NES_CPU_WR(3), 0x5100, 1) # PRG Mode
+        self.do(OP_NES, _CPU_WR_OPS[3], 0x5100, 1) # PRG Mode
         # high bit determines RAM or ROM
-        self.do(OpType.NES, NES.NES_CPU_WR(0b10000000 | bank), 0x5114, 1)
+        self.do(OP_NES, _CPU_WR_OPS[0b10000000 | bank], 0x5114, 1)
 
     def set_chr_bank(self, bank):
         sys.stderr.write(f"Swapping in CHR bank {bank}...\n")
-        self.do(OpType.NES, NES.NES_CPU_WR(3), 0x5101, 1) # CHR Mode
-        self.do(OpType.NES, NES.NES_CPU_WR(bank >> 8 ), 0x5130, 1)
-        self.do(OpType.NES, NES.NES_CPU_WR(bank & 0xff), 0x5120, 1)
+        self.do(OP_NES, _CPU_WR_OPS[3], 0x5101, 1) # CHR Mode
+        self.do(OP_NES, _CPU_WR_OPS[bank >> 8], 0x5130, 1)
+        self.do(OP_NES, _CPU_WR_OPS[bank & 0xff], 0x5120, 1)
 
-class INLRetro(metaclass=Singleton):
+class INLRetro:
     mappers = {
             0  : NROM,
             1  : SxROM,
@@ -310,27 +334,67 @@ class INLRetro(metaclass=Singleton):
         self.prg_size = prg_size
         self.chr_size = chr_size
         self.device = usb.core.find(idVendor=0x16c0, idProduct=0x05dc)
-        self.mapper = INLRetro.mappers[mapper]()
-        self.prg_bank_size, self.chr_bank_size = type(self.mapper).banks
-
+        # reusable response buffers, keyed by transfer length, so the status
+        # reads in do() don't allocate a fresh array per call
+        self._resp_bufs = {}
+        # reusable payload receive buffer; pyusb only fills caller-supplied
+        # array.array buffers
+        self._payload_buf = array('B', bytes(128))
+        # which direction the buffer state machine was last set up for
+        self._last_init = None
+        # the dump init transfers are constant per direction; build the
+        # sequences once
+        self._prg_init_seq = self._build_init_seq(0x20dd, 0x0800)
+        self._chr_init_seq = self._build_init_seq(0x21dd, 0x0000)
         if self.device is None:
             raise IOError("Unable to locate INLretro device. Be sure it is connected properly.")
         sys.stderr.write("Found INLRetro device.\n")
 
         self.device.set_configuration()
-        self.do(OpType.IO, IO.IO_RESET(0x00), 0x0000, 1)
-        self.do(OpType.IO, IO.NES_INIT(), 0x0000, 1)
+        # payloads stream much faster over a bulk IN endpoint when the
+        # firmware provides one; otherwise fall back to control transfers
+        intf = self.device.get_active_configuration()[(0, 0)]
+        self.bulk_in = usb.util.find_descriptor(intf, custom_match=lambda e:
+                usb.util.endpoint_direction(e.bEndpointAddress) ==
+                    usb.util.ENDPOINT_IN and
+                usb.util.endpoint_type(e.bmAttributes) ==
+                    usb.util.ENDPOINT_TYPE_BULK)
+        self.do(OP_IO, IO_RESET_OP, 0x0000, 1)
+        self.do(OP_IO, NES_INIT_OP, 0x0000, 1)
+        # built after the device init so any mapper setup transfers issued
+        # by _post_init hit a configured device
+        self.mapper = INLRetro.mappers[mapper](self)
+        self.prg_bank_size, self.chr_bank_size = type(self.mapper).banks
+        # bank sizes are fixed per mapper, so one receive buffer per
+        # direction serves the whole dump
+        self._prg_buf = bytearray(self.prg_bank_size * 1024)
+        self._chr_buf = bytearray(self.chr_bank_size * 1024)
         sys.stderr.write(f'Ready to read {self.mapper.name} board...\n')
 
-    def do(self, select:OpType, op_misc, addr, returnLength):
-        response = self.device.ctrl_transfer(
-            0xc0, select.value, op_misc, addr, returnLength)[0]
+    def do(self, select:int, op_misc, addr, returnLength):
+        buf = self._resp_bufs.get(returnLength)
+        if buf is None:
+            buf = self._resp_bufs[returnLength] = array('B', bytes(returnLength))
+        self.device.ctrl_transfer(0xc0, select, op_misc, addr, buf)
+        response = buf[0]
         if response:
             raise IOError(f'INLRetro device responded with error code {response}')
 
-    def get_buffer(self):
-        return bytearray(self.device.ctrl_transfer(
-            0xc0, OpType.BUFFER.value, Buffer.BUFF_PAYLOAD(), 0x0000, 128))
+    def read_buffer(self, view):
+        """
+        Reads the next payload into the provided writable buffer and returns
+        the number of bytes received. The transfer lands in a reusable
+        array.array first - the only receive-buffer type pyusb fills in
+        place - and is copied out.
+        """
+        buf = self._payload_buf
+        if self.bulk_in is not None:
+            n = self.device.read(self.bulk_in.bEndpointAddress, buf)
+        else:
+            n = self.device.ctrl_transfer(
+                0xc0, OP_BUFFER, BUFF_PAYLOAD_OP, 0x0000, buf)
+        view[:n] = memoryview(buf)[:n]
+        return n
 
     def set_prg_bank(self, bank):
         self.mapper.set_prg_bank(bank)
@@ -338,63 +402,93 @@ class INLRetro(metaclass=Singleton):
     def set_chr_bank(self, bank):
         self.mapper.set_chr_bank(bank)
 
-    def _init_dump(self, n_part_data_addr, n_mapvar_data_addr):
-        self.do(OpType.OPER,   SET_OPERATION, 0x0001, 1)
-        self.do(OpType.BUFFER, Buffer.RAW_BUFFER_RESET(), 0x0000, 1)
-        self.do(OpType.BUFFER, Buffer.ALLOCATE_BUFFER0(4), 0x0000, 1)
-        self.do(OpType.BUFFER, Buffer.ALLOCATE_BUFFER1(4), 0x8004, 1)
-        self.do(OpType.BUFFER, Buffer.SET_RELOAD_PAGENUM0(1), 0x0000, 1)
-        self.do(OpType.BUFFER, Buffer.SET_RELOAD_PAGENUM1(1), 0x0000, 1)
-        self.do(OpType.BUFFER, Buffer.SET_MEM_N_PART(0), n_part_data_addr, 1)
-        self.do(OpType.BUFFER, Buffer.SET_MEM_N_PART(1), n_part_data_addr, 1)
-        self.do(OpType.BUFFER, Buffer.SET_MAP_N_MAPVAR(0), n_mapvar_data_addr, 1)
-        self.do(OpType.BUFFER, Buffer.SET_MAP_N_MAPVAR(1), n_mapvar_data_addr, 1)
-        self.do(OpType.OPER,   SET_OPERATION, 0x00d2, 1)
+    def _build_init_seq(self, n_part_data_addr, n_mapvar_data_addr):
+        return ((OP_OPER,   SET_OPERATION, 0x0001, 1),
+                (OP_BUFFER, RAW_BUFFER_RESET_OP, 0x0000, 1),
+                (OP_BUFFER, ALLOCATE_BUFFER0_OP, 0x0000, 1),
+                (OP_BUFFER, ALLOCATE_BUFFER1_OP, 0x8004, 1),
+                (OP_BUFFER, SET_RELOAD_PAGENUM0_OP, 0x0000, 1),
+                (OP_BUFFER, SET_RELOAD_PAGENUM1_OP, 0x0000, 1),
+                (OP_BUFFER, SET_MEM_N_PART0_OP, n_part_data_addr, 1),
+                (OP_BUFFER, SET_MEM_N_PART1_OP, n_part_data_addr, 1),
+                (OP_BUFFER, SET_MAP_N_MAPVAR0_OP, n_mapvar_data_addr, 1),
+                (OP_BUFFER, SET_MAP_N_MAPVAR1_OP, n_mapvar_data_addr, 1),
+                (OP_OPER,   SET_OPERATION, 0x00d2, 1))
+
+    def _init_dump(self, seq):
+        for select, op_misc, addr, length in seq:
+            self.do(select, op_misc, addr, length)
 
     def _init_chr_dump(self):
-        self._init_dump(0x21dd, 0x0000)
+        if self._last_init != 'chr':
+            self._last_init = 'chr'
+            self._init_dump(self._chr_init_seq)
 
     def _init_prg_dump(self):
-        self._init_dump(0x20dd, 0x0800)
-
-    def _dump(self, io, size):
+        if self._last_init != 'prg':
+            self._last_init = 'prg'
+            self._init_dump(self._prg_init_seq)
+
+    def _dump(self, buf, size):
+        # each payload is received into the reusable array and copied once
+        # into the destination buffer
+        mv = memoryview(buf)
+        off = 0
         for i in range(size * 8):
-            self.do(OpType.BUFFER,  0x0061, 0x0000, 3)
-            io.write(self.get_buffer())
+            self.do(OP_BUFFER, GET_CUR_BUFF_STATUS_OP, 0x0000, 3)
+            off += self.read_buffer(mv[off:off + 128])
+        return off
 
     def dump_prg_bank(self, bank):
-        buf = BytesIO()
+        buf = self._prg_buf
         self.set_prg_bank(bank)
         self._init_prg_dump()
-        self._dump(buf, self.prg_bank_size)
-        return buf
+        n = self._dump(buf, self.prg_bank_size)
+        return buf if n == len(buf) else buf[:n]
 
     def dump_chr_bank(self, bank):
-        buf = BytesIO()
+        buf = self._chr_buf
         self.set_chr_bank(bank)
         self._init_chr_dump()
-        self._dump(buf, self.chr_bank_size)
-        return buf
-
-    def dump_full(self, io):
+        n = self._dump(buf, self.chr_bank_size)
+        return buf if n == len(buf) else buf[:n]
+
+    def dump_full(self, io, hasher=None, expected=None):
+        """
+        Dumps the full PRG and CHR ROM to io. When expected holds the bank
+        digests of a previous dump, the dump aborts at the first differing
+        bank instead of completing a full second pass.
+        """
         bank_hashes = set()
+        self._bank_digests = digests = []
 
         if self.prg_size is None:
             prg_bank_count = 256
         else:
             prg_bank_count = self.prg_size // self.prg_bank_size
         sys.stderr.write("Dumping PRG ROM...\n")
+        dump_bank = self.dump_prg_bank
+        write = io.write
         for i in range(prg_bank_count):
-            buf = self.dump_prg_bank(i)
-            bank_hash = get_hash(buf, 0, buf.tell())
+            data = dump_bank(i)
+            # 64-bit fingerprint: ints compare and store far more compactly
+            # than 32-char hex digests in the dedup set
+            bank_hash = int.from_bytes(md5(data).digest()[:8], 'little')
             # The number of banks should always be a power of 2.
             if not self.prg_size and is_power_of_two(i) and bank_hash in bank_hashes:
                 sys.stderr.write("Duplicated bank, stopping PRG dump...\n")
                 self.prg_size = (i) * self.prg_bank_size
                 break
             bank_hashes.add(bank_hash)
-            buf.seek(0)
-            io.write(buf.read())
+            digests.append(bank_hash)
+            if expected is not None and (len(digests) > len(expected) or
+                    expected[len(digests) - 1] != bank_hash):
+                raise HashMismatchError("Second read did not match the first! "
+                        "Please make sure the cartridge is seated properly "
+                        "and try again.")
+            write(data)
+            if hasher is not None:
+                hasher.update(data)
 
         if self.chr_size == 0:
             return
@@ -404,30 +498,44 @@ class INLRetro(metaclass=Singleton):
             chr_bank_count = self.chr_size // self.chr_bank_size
         bank_hashes.clear()
         sys.stderr.write("Dumping CHR ROM...\n")
+        dump_bank = self.dump_chr_bank
+        write = io.write
         for i in range(chr_bank_count):
-            buf = self.dump_chr_bank(i)
-            bank_hash = get_hash(buf, 0, buf.tell())
+            data = dump_bank(i)
+            bank_hash = int.from_bytes(md5(data).digest()[:8], 'little')
             # The number of banks should always be a power of 2.
             if not self.chr_size and is_power_of_two(i) and bank_hash in bank_hashes:
                 sys.stderr.write("Duplicated bank - stopping CHR dump...\n")
                 self.chr_size = (i) * self.chr_bank_size
                 break
             bank_hashes.add(bank_hash)
-            buf.seek(0)
-            io.write(buf.read())
+            digests.append(bank_hash)
+            if expected is not None and (len(digests) > len(expected) or
+                    expected[len(digests) - 1] != bank_hash):
+                raise HashMismatchError("Second read did not match the first! "
+                        "Please make sure the cartridge is seated properly "
+                        "and try again.")
+            write(data)
+            if hasher is not None:
+                hasher.update(data)
 
     def dump_and_verify(self, io):
-        self.dump_full(io)
-        digest = get_hash(io)
+        # hash while dumping so the buffer never needs a second pass
+        hasher = md5()
+        self.dump_full(io, hasher)
+        digest = hasher.hexdigest()
         sys.stderr.write(f'Hash: {digest}\n')
         if digest in known_md5:
             sys.stderr.write("Matched known hash.\n")
         else:
             sys.stderr.write("Did not match a known hash, rereading...\n")
             last_digest = digest
+            self._last_init = None # replay the full setup for the re-read
+            expected = self._bank_digests
+            hasher = md5()
             buf = BytesIO()
-            self.dump_full(buf)
-            digest = get_hash(buf)
+            self.dump_full(buf, hasher, expected)
+            digest = hasher.hexdigest()
             sys.stderr.write(f'Hash: {digest}\n')
             if digest == last_digest:
                 raise UnknownHashError("Hash matches previous read but not a known hash. "
@@ -444,17 +552,36 @@ class HashMismatchError(RuntimeError):
 
 def get_hash(buf, start=0, end=None):
     pos = buf.tell()
+    if isinstance(buf, BytesIO):
+        # hash the underlying buffer in place - no read(), no temporary bytes
+        view = buf.getbuffer()
+        if end is None:
+            end = len(view)
+        return md5(view[start:end]).hexdigest()
+    if not start and end is None and file_digest is not None:
+        # whole-buffer hash: file_digest reads in optimized C chunks
+        buf.seek(0)
+        digest = file_digest(buf, md5).hexdigest()
+        buf.seek(pos)
+        return digest
     if end is None:
         buf.seek(0, 2)
         end = buf.tell()
     buf.seek(start)
     hash_ = md5()
-    hash_.update(buf.read(end - start))
+    # hash in chunks rather than materializing the whole range at once
+    remaining = end - start
+    while remaining > 0:
+        chunk = buf.read(min(remaining, 65536))
+        if not chunk:
+            break
+        hash_.update(chunk)
+        remaining -= len(chunk)
     buf.seek(pos)
     return hash_.hexdigest()
 
 def is_power_of_two(number):
-    return bool(number) and math.log(number, 2).is_integer()
+    return number > 0 and not number & (number - 1)
 
 def main():
     MAPPER = int(sys.argv[1])
@@ -474,27 +601,23 @@ def main():
 #      CHR_SIZE = 8
 
     inlretro = INLRetro(MAPPER, PRG_SIZE, CHR_SIZE)
-    buf = BytesIO()
-
-    fail = inlretro.dump_and_verify(buf)
-    if fail < 0:
-        return
-    elif fail > 0:
-        sys.stderr.write("Proceed anyway? (y/n) ")
-        answer = input()
-        if not answer.lower().startswith('y'):
-            return
 
-    header = bytearray(b'NES\x1a\x00\x00\x00\0\0\0\0\0\0\0\0\0')
-    header[4] = PRG_SIZE // 16
-    header[5] = CHR_SIZE // 8
-    header[6] |= (MAPPER & 0xf) << 4
-    header[7] |= (MAPPER & 0xf0)
-
-    with open('dump.nes', 'wb') as f:
-        f.write(header)
-        buf.seek(0)
-        f.write(buf.read())
+    header = struct.pack('<4sBBBB8x', b'NES\x1a', PRG_SIZE >> 4,
+                         CHR_SIZE >> 3, (MAPPER & 0xf) << 4, MAPPER & 0xf0)
+
+    # stream the dump straight into the output file; the running hash in
+    # dump_and_verify means the data never needs a second pass
+    try:
+        with open('dump.nes', 'wb') as f:
+            f.write(header)
+            inlretro.dump_and_verify(f)
+    except UnknownHashError as e:
+        # both reads agreed, the cart just isn't in hashdb yet (homebrew,
+        # unlicensed, or a new entry for hash.py) - keep the dump
+        sys.stderr.write(f'{e}\n')
+    except Exception:
+        os.remove('dump.nes')
+        raise
 #  
 if __name__ == '__main__':
     main()